@@ -3,11 +3,17 @@
 CORRECT SCALING FOR OPENBCI
 Normal EEG range: ±100μV
 """
+import numpy as np
 import serial
+import sys
 import time
-import math
+import os
+import queue
+import threading
+from openbci_decoder import OpenBCIDecoder, set_low_latency
 
-ser = serial.Serial("/dev/cu.usbserial-DM01MV82", 115200, timeout=0.1)
+ser = serial.Serial("/dev/cu.usbserial-DM01MV82", 115200, timeout=0.05)
+set_low_latency(ser)
 time.sleep(2)
 
 print("Initializing OpenBCI...")
@@ -20,79 +26,105 @@ ser.write(b'b')
 
 print("Streaming... (Blue+Red lights ON)\n")
 
-buffer = bytearray()
+decoder = OpenBCIDecoder()
 packet_count = 0
+last_refresh = 0.0
 
-# FIX: Correct scale factor
-# Your values are 1000x too high, so divide by 1000
-SCALE = 0.02235 / 1000  # This should give proper μV range
+READ_SIZE = 33 * 8  # Pull ~8 packets per read instead of a few bytes at a time
+MAX_READ = 4096  # Upper bound when catching up on a backlog
+REFRESH_INTERVAL = 0.04  # ~25 fps, the old every-10th-packet rate at 250 Hz
+
+# Activity bands by |μV|: below 5, 20, 50, 100, and anything above
+ACTIVITY_THRESHOLDS = (5, 20, 50, 100)
+ACTIVITY_BANDS = (
+    ("Very quiet", '░'),
+    ("Beta (alert/thinking)", '▒'),
+    ("Alpha (relaxed)", '▓'),
+    ("Theta (drowsy)", '█'),
+    ("ARTIFACT (muscle/movement)", '█'),
+)
+
+# Pre-rendered 40-column bars for every length, so frames only index into them
+BARS = {c: [(c * n).ljust(40) for n in range(41)] for c in '░▒▓█'}
+
+
+def render_lines(lines):
+    """Join screen lines, erasing whatever the previous frame left to the right of each"""
+    return "".join(line + "\033[K\n" for line in lines)
+
+
+# Static parts of the screen, rendered and encoded once. Frames redraw in place
+# from the top-left corner instead of clearing the whole screen, which avoids flicker.
+FRAME_HEADER = ("\033[H" + render_lines([
+    "",
+    "="*80,
+    "NORMAL EEG RANGES (for reference):",
+    "  • Relaxed/Eyes closed: 10-50 μV (Alpha waves)",
+    "  • Alert/Thinking: 5-30 μV (Beta waves)",
+    "  • Drowsy: 20-100 μV (Theta waves)",
+    "  • Muscle artifacts: >100 μV (NOT brain activity)",
+    "="*80,
+])).encode()
+FRAME_STATUS = render_lines(["YOUR REAL-TIME EEG | Packets: {}", "-"*80])
+# One line template per channel with the label already filled in
+FRAME_CHANNELS = tuple(render_lines([f"  Ch {i:2d}: " + "{:+8.2f} μV |{}| {}"]) for i in range(1, 9))
+FRAME_FOOTER = (render_lines([
+    "-"*80,
+    "",
+    "TIPS FOR BETTER SIGNAL:",
+    "  1. Relax your jaw and face muscles",
+    "  2. Close your eyes to see Alpha waves (8-12 Hz)",
+    "  3. Values >100μV usually mean electrode needs adjustment",
+]) + "\033[J").encode()
+
+
+def display(channels):
+    parts = [FRAME_STATUS.format(packet_count)]
+
+    # Activity band and bar length for all channels in one go
+    abs_vals = np.abs(channels)
+    band_indices = np.searchsorted(ACTIVITY_THRESHOLDS, abs_vals, side='right')
+    bar_lengths = np.minimum(abs_vals / 2, 40).astype(np.intp)
+
+    # Only string building is left per channel
+    for line, val, band, length in zip(FRAME_CHANNELS, channels.tolist(), band_indices.tolist(), bar_lengths.tolist()):
+        activity, bar_char = ACTIVITY_BANDS[band]
+        parts.append(line.format(val, BARS[bar_char][length], activity))
+
+    # One unbuffered write per frame, bypassing print() and the stdout lock.
+    # Only the changing lines get encoded; header and footer are already bytes.
+    os.write(sys.stdout.fileno(), FRAME_HEADER + "".join(parts).encode() + FRAME_FOOTER)
+
+
+def pump_serial(chunks):
+    """Read serial data in a background thread so screen refreshes can't stall the UART"""
+    try:
+        while True:
+            # Blocking read of several packets at once, or the whole backlog if the
+            # board got ahead of us; returns early on timeout
+            chunk = ser.read(min(MAX_READ, max(READ_SIZE, ser.in_waiting)))
+            if chunk:
+                chunks.put(chunk)
+    except Exception as e:
+        # Hand the failure to the main thread so it exits instead of waiting forever
+        chunks.put(e)
+
+
+chunks = queue.SimpleQueue()
+threading.Thread(target=pump_serial, args=(chunks,), daemon=True).start()
 
 while True:
-    if ser.in_waiting:
-        buffer.extend(ser.read(ser.in_waiting))
-
-        while len(buffer) >= 33:
-            try:
-                start = buffer.index(0xA0)
-                if start + 32 < len(buffer) and buffer[start + 32] == 0xC0:
-                    packet = buffer[start:start + 33]
-                    packet_count += 1
-
-                    channels = []
-                    for i in range(8):
-                        idx = 2 + (i * 3)
-                        val = (packet[idx] << 16) | (packet[idx+1] << 8) | packet[idx+2]
-                        if val & 0x800000:
-                            val -= 0x1000000
-                        uV = val * SCALE
-                        channels.append(uV)
-
-                    if packet_count % 10 == 0:
-                        print("\033[H\033[J")
-                        print("="*80)
-                        print("NORMAL EEG RANGES (for reference):")
-                        print("  • Relaxed/Eyes closed: 10-50 μV (Alpha waves)")
-                        print("  • Alert/Thinking: 5-30 μV (Beta waves)")
-                        print("  • Drowsy: 20-100 μV (Theta waves)")
-                        print("  • Muscle artifacts: >100 μV (NOT brain activity)")
-                        print("="*80)
-                        print(f"YOUR REAL-TIME EEG | Packets: {packet_count}")
-                        print("-"*80)
-
-                        for i, val in enumerate(channels):
-                            # Determine what type of activity
-                            abs_val = abs(val)
-                            if abs_val < 5:
-                                activity = "Very quiet"
-                                bar_char = '░'
-                            elif abs_val < 20:
-                                activity = "Beta (alert/thinking)"
-                                bar_char = '▒'
-                            elif abs_val < 50:
-                                activity = "Alpha (relaxed)"
-                                bar_char = '▓'
-                            elif abs_val < 100:
-                                activity = "Theta (drowsy)"
-                                bar_char = '█'
-                            else:
-                                activity = "ARTIFACT (muscle/movement)"
-                                bar_char = '█'
-
-                            # Visual bar
-                            bar_len = int(min(abs_val / 2, 40))
-                            bar = bar_char * bar_len
-
-                            print(f"  Ch {i+1:2d}: {val:+8.2f} μV |{bar:40s}| {activity}")
-
-                        print("-"*80)
-                        print("\nTIPS FOR BETTER SIGNAL:")
-                        print("  1. Relax your jaw and face muscles")
-                        print("  2. Close your eyes to see Alpha waves (8-12 Hz)")
-                        print("  3. Values >100μV usually mean electrode needs adjustment")
-
-                    buffer = buffer[start + 33:]
-                else:
-                    buffer = buffer[start + 1:]
-            except ValueError:
-                buffer = bytearray()
-                break
\ No newline at end of file
+    chunk = chunks.get()
+    if isinstance(chunk, Exception):
+        raise chunk
+
+    packets = decoder.feed_packets(chunk)
+    if len(packets):
+        packet_count += len(packets)
+
+        # Refresh on a clock rather than a packet count. The screen only shows
+        # the newest packet, so that is the only one worth decoding.
+        now = time.monotonic()
+        if now - last_refresh >= REFRESH_INTERVAL:
+            last_refresh = now
+            display(decoder.decode_channels(packets[-1:])[0])
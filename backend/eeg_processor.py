@@ -5,8 +5,7 @@ Based on neuroscience research for emotional response
 """
 import numpy as np
 from scipy import signal
-from scipy.fft import fft, fftfreq
-import json
+from scipy.fft import rfft, rfftfreq
 
 class EEGProcessor:
     def __init__(self, sampling_rate=250):
@@ -25,14 +24,19 @@ class EEGProcessor:
         # Assuming standard 10-20 placement
         self.channel_names = ['Fp1', 'Fp2', 'C3', 'C4', 'P7', 'P8', 'O1', 'O2']
 
+        # Butterworth coefficients per (low, high) band, filled on first use
+        self.filter_coeffs = {}
+
     def bandpass_filter(self, data, low_freq=1, high_freq=45):
         """Apply bandpass filter to remove noise"""
-        nyquist = self.sampling_rate / 2
-        low = low_freq / nyquist
-        high = high_freq / nyquist
-
-        # Design filter
-        b, a = signal.butter(4, [low, high], btype='band')
+        # Design filter - only depends on the band, so do it once per band
+        band = (low_freq, high_freq)
+        if band not in self.filter_coeffs:
+            nyquist = self.sampling_rate / 2
+            low = low_freq / nyquist
+            high = high_freq / nyquist
+            self.filter_coeffs[band] = signal.butter(4, [low, high], btype='band')
+        b, a = self.filter_coeffs[band]
 
         # Apply filter
         filtered = signal.filtfilt(b, a, data)
@@ -40,15 +44,15 @@ class EEGProcessor:
 
     def calculate_band_power(self, data):
         """Calculate power for each frequency band"""
-        # Apply FFT
+        # Apply FFT - real input, so only compute the non-negative frequencies
         n = len(data)
-        fft_vals = fft(data)
-        fft_freq = fftfreq(n, 1/self.sampling_rate)
+        fft_vals = rfft(data)
+        fft_freq = rfftfreq(n, 1/self.sampling_rate)
 
-        # Get positive frequencies only
-        pos_mask = fft_freq > 0
-        freqs = fft_freq[pos_mask]
-        power = np.abs(fft_vals[pos_mask]) ** 2
+        # Drop DC, then square the magnitudes in place instead of allocating again
+        freqs = fft_freq[1:]
+        power = np.abs(fft_vals[1:])
+        np.square(power, out=power)
 
         # Calculate power for each band
         band_powers = {}
@@ -103,12 +107,8 @@ class EEGProcessor:
         3. P300 amplitude - attention/significance
         """
 
-        # Process each channel
-        processed_channels = []
-        for ch_data in channels_data:
-            # Filter data
-            filtered = self.bandpass_filter(ch_data)
-            processed_channels.append(filtered)
+        # Filter all channels in one pass (rows are channels)
+        processed_channels = self.bandpass_filter(np.asarray(channels_data))
 
         # 1. Frontal Alpha Asymmetry (Fp1 vs Fp2)
         faa = self.calculate_frontal_alpha_asymmetry(
@@ -183,9 +183,10 @@ class EEGProcessor:
         """Get frequency band power for each channel"""
         summary = []
 
-        for i, ch_data in enumerate(channels_data):
-            # Filter and calculate band powers
-            filtered = self.bandpass_filter(ch_data)
+        # Filter all channels in one pass, then calculate band powers per channel
+        filtered_channels = self.bandpass_filter(np.asarray(channels_data))
+
+        for i, filtered in enumerate(filtered_channels):
             band_powers = self.calculate_band_power(filtered)
 
             summary.append({
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+OpenBCI Cyton serial setup and packet decoding
+Shared by cli_streamer.py and server.py
+"""
+import struct
+import sys
+import numpy as np
+
+PACKET_SIZE = 33
+START_BYTE = 0xA0
+END_BYTE = 0xC0
+
+# Correct scale factor - raw counts to μV (the plain 0.02235 was 1000x too high)
+SCALE = 0.02235 / 1000
+
+# macOS serial ioctl _IOW('T', 0, unsigned long): receive latency in microseconds
+IOSSDATALAT = 0x80085400
+
+
+def set_low_latency(ser):
+    """
+    Ask the USB serial driver to pass bytes on immediately instead of batching
+    them behind the FTDI 16 ms latency timer. Supported on Linux and macOS;
+    returns False where the driver refuses.
+    """
+    try:
+        if sys.platform == 'darwin':
+            # pyserial has no macOS support for this; set a 1 μs latency directly
+            import fcntl
+            fcntl.ioctl(ser.fileno(), IOSSDATALAT, struct.pack('L', 1))
+        else:
+            ser.set_low_latency_mode(True)
+        return True
+    except (AttributeError, NotImplementedError, ValueError, OSError):
+        return False
+
+
+class OpenBCIDecoder:
+    # Fixed attribute set, looked up on every chunk
+    __slots__ = ('scale', 'buffer', 'packet_offsets')
+
+    def __init__(self, scale=SCALE):
+        self.scale = scale
+        self.buffer = bytearray()
+        self.packet_offsets = np.arange(PACKET_SIZE)
+
+    def feed(self, data):
+        """Add raw serial bytes, return the (N, 8) μV values of every complete packet"""
+        return self.decode_channels(self.feed_packets(data))
+
+    def feed_packets(self, data):
+        """Add raw serial bytes, return every complete packet undecoded as an (N, 33) array"""
+        self.buffer.extend(data)
+
+        # Scan the whole buffer for packets at once
+        packets, consumed = self.frame_packets(self.buffer)
+        del self.buffer[:consumed]
+        return packets
+
+    def frame_packets(self, buf):
+        """
+        Find complete 0xA0 ... 0xC0 packets in buf
+        Returns the (N, 33) packets and how many leading bytes are used up
+        """
+        data = np.frombuffer(buf, dtype=np.uint8)
+
+        # Every position with a start byte and a matching end byte 32 bytes later
+        candidates = np.flatnonzero(
+            (data[:-(PACKET_SIZE - 1)] == START_BYTE) & (data[PACKET_SIZE - 1:] == END_BYTE)
+        )
+
+        starts = []
+        end = 0
+        for start in candidates.tolist():
+            if start >= end:  # Skip matches inside a packet we already took
+                starts.append(start)
+                end = start + PACKET_SIZE
+
+        packets = data[np.array(starts, dtype=np.intp)[:, None] + self.packet_offsets]
+
+        # Anything before the last 32 bytes can no longer start a packet
+        return packets, max(end, len(data) - (PACKET_SIZE - 1))
+
+    def decode_channels(self, packets):
+        """Decode (N, 33) packets into an (N, 8) array of μV values"""
+        # Pad each big-endian 24-bit sample with a low zero byte so it reads as
+        # a 32-bit int; the arithmetic shift back down then sign-extends it
+        words = np.zeros((len(packets), 8, 4), dtype=np.uint8)
+        words[..., :3] = packets[:, 2:26].reshape(-1, 8, 3)
+        values = words.view('>i4')[..., 0] >> 8
+        return values * self.scale
@@ -6,119 +6,237 @@ With EEG analysis for love detection
 """
 import serial
 import time
+import os
+import select
 import json
 import asyncio
 import websockets
 import threading
-import queue
 import numpy as np
 from eeg_processor import EEGProcessor
+from openbci_decoder import OpenBCIDecoder, set_low_latency
+
+# Same text json.dumps produces for an eeg sample dict. The fields are plain
+# floats and ints, so formatting them straight in skips building a dict per sample.
+EEG_MESSAGE = '{{"type": "eeg", "timestamp": {}, "packet_num": {}, "channels": {}, "status": "streaming"}}'
 
 class RealOpenBCIServer:
     def __init__(self):
         self.port = "/dev/cu.usbserial-DM01MV82"
         self.baudrate = 115200
         self.scale = 0.02235 / 1000  # CORRECT SCALE that showed ~40μV
+        self.sample_rate = 250  # Cyton streams at a fixed 250 Hz
+        self.read_size = 33 * 8  # Aim for ~8 packets per wake-up
+        self.batch_window = 8 / self.sample_rate  # Longest wait for the rest of a batch
+        self.max_read = 4096  # Upper bound on bytes taken per os.read
+        self.silence_timeout = 5.0  # A streaming board this quiet has stalled
+        self.reconnect_deadline = 60.0  # Give up after this long without packets
 
         self.clients = set()
-        self.data_queue = queue.Queue(maxsize=1000)
+
+        # Sample ring shared by the serial thread (only writer of ring_tail) and
+        # the broadcaster (only writer of ring_head), so no lock is needed
+        self.ring_size = 1024
+        self.ts_ring = np.empty(self.ring_size, dtype=np.float64)
+        self.num_ring = np.empty(self.ring_size, dtype=np.int64)
+        self.ch_ring = np.empty((self.ring_size, 8), dtype=np.float64)
+        self.ring_head = 0
+        self.ring_tail = 0
+
         self.is_streaming = False
         self.ser = None
+        self.decoder = OpenBCIDecoder(self.scale)
+        self.loop = None
+        self.data_ready = None
 
         # Initialize scientific EEG processor
-        self.eeg_processor = EEGProcessor(sampling_rate=250)
+        self.eeg_processor = EEGProcessor(sampling_rate=self.sample_rate)
         print("✓ Scientific EEG processor initialized")
 
-    def connect_hardware(self):
-        """Connect to REAL OpenBCI hardware"""
-        try:
-            print("Connecting to OpenBCI...")
-            self.ser = serial.Serial(self.port, self.baudrate, timeout=0.1)
-            time.sleep(2)
-
-            # Initialize sequence that WORKS
-            self.ser.write(b's')  # stop
-            time.sleep(0.5)
-            self.ser.reset_input_buffer()
-            self.ser.write(b'd')  # defaults
-            time.sleep(0.5)
-            self.ser.write(b'b')  # begin - BLUE+RED LIGHTS ON
-
-            self.is_streaming = True
-            print("✓ OpenBCI CONNECTED - Blue+Red lights should be ON")
-            return True
+    def connect_hardware(self, deadline=15.0):
+        """Connect to REAL OpenBCI hardware, retrying with doubling delays until the deadline"""
+        give_up_at = time.monotonic() + deadline
+        delay = 0.5
 
-        except Exception as e:
-            print(f"❌ Connection failed: {e}")
-            return False
+        while True:
+            try:
+                print("Connecting to OpenBCI...")
+                self.ser = serial.Serial(self.port, self.baudrate, timeout=0.1)
+                if set_low_latency(self.ser):
+                    print("✓ Low-latency serial mode enabled")
+                time.sleep(2)
+
+                # Initialize sequence that WORKS
+                self.ser.write(b's')  # stop
+                time.sleep(0.5)
+                self.ser.reset_input_buffer()
+                self.ser.write(b'd')  # defaults
+                time.sleep(0.5)
+                self.ser.write(b'b')  # begin - BLUE+RED LIGHTS ON
+
+                self.is_streaming = True
+                print("✓ OpenBCI CONNECTED - Blue+Red lights should be ON")
+                return True
+
+            except Exception as e:
+                if self.ser:
+                    self.ser.close()
+                    self.ser = None
+
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    print(f"❌ Connection failed: {e}")
+                    return False
+
+                print(f"⚠️ Connection attempt failed ({e}), retrying in {min(delay, remaining):.1f}s...")
+                time.sleep(min(delay, remaining))
+                delay *= 2
 
     def serial_reader(self):
         """Read REAL data from OpenBCI in background thread"""
-        buffer = bytearray()
         packet_count = 0
 
+        # Backoff across consecutive failed reconnects; reset by the first packet
+        reconnect_delay = 0.5
+        give_up_at = None
+
+        # pyserial has configured the port; read its non-blocking descriptor
+        # directly instead of going through Serial.read() on every wake-up
+        fd = self.ser.fileno()
+
         while self.is_streaming:
             try:
-                if self.ser and self.ser.in_waiting:
-                    buffer.extend(self.ser.read(self.ser.in_waiting))
-
-                    while len(buffer) >= 33:
-                        # Find packet start (0xA0)
-                        start = buffer.index(0xA0) if 0xA0 in buffer else -1
-
-                        if start >= 0 and start + 32 < len(buffer):
-                            # Check for packet end (0xC0)
-                            if buffer[start + 32] == 0xC0:
-                                packet = buffer[start:start + 33]
-                                packet_count += 1
-
-                                # Parse 8 channels with CORRECT scaling
-                                channels = []
-                                for i in range(8):
-                                    idx = 2 + (i * 3)
-                                    val = (packet[idx] << 16) | (packet[idx+1] << 8) | packet[idx+2]
-                                    if val & 0x800000:
-                                        val -= 0x1000000
-                                    # This scaling gave us ~40μV which is CORRECT
-                                    channels.append(round(val * self.scale, 2))
-
-                                # REAL DATA VERIFICATION - Log every 50 packets
-                                if packet_count % 50 == 0:
-                                    print(f"\n✓ REAL DATA #{packet_count}: Ch1={channels[0]:.2f}μV, Ch2={channels[1]:.2f}μV")
-                                    if all(-100 <= ch <= 100 for ch in channels):
-                                        print("  ✓ Values in valid EEG range (-100 to +100 μV)")
-                                    if len(set(channels)) > 1:
-                                        print("  ✓ Channels vary (REAL brain signals, not fake!)")
-
-                                # Queue data for WebSocket
-                                data = {
-                                    'type': 'eeg',
-                                    'timestamp': time.time(),
-                                    'packet_num': packet_count,
-                                    'channels': channels,
-                                    'status': 'streaming'
-                                }
-
-                                # Don't block if queue is full
-                                try:
-                                    self.data_queue.put_nowait(json.dumps(data))
-                                except queue.Full:
-                                    pass
-
-                                buffer = buffer[start + 33:]
-                            else:
-                                buffer = buffer[start + 1:]
-                        else:
-                            if len(buffer) > 100:
-                                buffer = buffer[-33:]
-                            break
-
-                time.sleep(0.001)
+                # Sleep in the kernel until bytes arrive, then collect a batch
+                ready, _, _ = select.select([fd], [], [], self.silence_timeout)
+                if not ready:
+                    raise serial.SerialException(f"no data for {self.silence_timeout:.0f}s, board may have reset")
+
+                chunk = self.read_batch(fd)
+                if not chunk:
+                    continue
+
+                # One clock read per chunk; the last packet in it arrived now
+                read_time = time.time()
+
+                # Frame and decode every complete packet in the chunk at once
+                channels = np.round(self.decoder.feed(chunk), 2)
+                if not len(channels):
+                    continue
+
+                # The link is healthy again
+                reconnect_delay = 0.5
+                give_up_at = None
+
+                first_num = packet_count + 1
+                packet_count += len(channels)
+
+                # REAL DATA VERIFICATION - Log every 50 packets
+                for num in range(first_num + (-first_num) % 50, packet_count + 1, 50):
+                    sample = channels[num - first_num].tolist()
+                    report = [f"\n✓ REAL DATA #{num}: Ch1={sample[0]:.2f}μV, Ch2={sample[1]:.2f}μV"]
+                    if all(-100 <= ch <= 100 for ch in sample):
+                        report.append("  ✓ Values in valid EEG range (-100 to +100 μV)")
+                    if len(set(sample)) > 1:
+                        report.append("  ✓ Channels vary (REAL brain signals, not fake!)")
+                    print("\n".join(report))  # One write per report
+
+                # Hand the batch to the broadcaster, then wake it once for the whole chunk
+                self.push_samples(read_time, first_num, channels)
+                self.loop.call_soon_threadsafe(self.data_ready.set)
+
+            except (serial.SerialException, OSError) as e:
+                print(f"Serial error: {e}")
+
+                # The port can open fine while the board is off, so keep the
+                # deadline running until real packets come back
+                now = time.monotonic()
+                if give_up_at is None:
+                    give_up_at = now + self.reconnect_deadline
+                remaining = give_up_at - now
+                if remaining <= 0:
+                    print(f"❌ No data from OpenBCI for {self.reconnect_deadline:.0f}s, giving up")
+                    self.is_streaming = False
+                    break
+
+                wait = min(reconnect_delay, remaining)
+                print(f"⚠️ Reconnecting in {wait:.1f}s...")
+                time.sleep(wait)
+                reconnect_delay *= 2
+
+                if not self.reconnect(max(give_up_at - time.monotonic(), 0)):
+                    self.is_streaming = False
+                    break
+                fd = self.ser.fileno()
 
             except Exception as e:
                 print(f"Serial error: {e}")
                 break
 
+    def read_batch(self, fd):
+        """
+        Read from the readable port until read_size bytes are in, or until
+        batch_window has passed since the first wake-up
+        """
+        chunk = bytearray()
+        give_up_at = time.monotonic() + self.batch_window
+
+        while True:
+            try:
+                data = os.read(fd, self.max_read)
+            except BlockingIOError:
+                data = None  # Spurious wake-up, nothing queued yet
+
+            if data == b'':
+                # Readable with nothing to read means the device went away
+                raise serial.SerialException("device reports readiness to read but returned no data")
+            if data:
+                chunk += data
+
+            remaining = give_up_at - time.monotonic()
+            if len(chunk) >= self.read_size or remaining <= 0:
+                return chunk
+            if not select.select([fd], [], [], remaining)[0]:
+                return chunk
+
+    def reconnect(self, deadline):
+        """Reopen the board after the link drops or goes silent"""
+        print("🔄 Reconnecting to OpenBCI...")
+        if self.ser:
+            self.ser.close()
+            self.ser = None
+
+        # Bytes left over from the old session must not be framed with the new one
+        self.decoder = OpenBCIDecoder(self.scale)
+        return self.connect_hardware(deadline)
+
+    def push_samples(self, read_time, first_num, channels):
+        """Copy a batch of decoded packets into the ring (serial thread only)"""
+        tail = self.ring_tail
+
+        # Drop what doesn't fit rather than block the serial thread
+        count = min(len(channels), self.ring_size - (tail - self.ring_head))
+        if count <= 0:
+            return
+
+        slots = np.arange(tail, tail + count) % self.ring_size
+        # Back-date earlier packets by the sample period so timestamps step evenly
+        self.ts_ring[slots] = read_time - (len(channels) - 1 - np.arange(count)) / self.sample_rate
+        self.num_ring[slots] = np.arange(first_num, first_num + count)
+        self.ch_ring[slots] = channels[:count]
+
+        # Publish only once the slots are filled in
+        self.ring_tail = tail + count
+
+    def pop_samples(self):
+        """Take every sample published since the last call (broadcaster only)"""
+        head, tail = self.ring_head, self.ring_tail
+        slots = np.arange(head, tail) % self.ring_size
+
+        # Fancy indexing copies, so the slots can be handed back right away
+        batch = zip(self.ts_ring[slots].tolist(), self.num_ring[slots].tolist(), self.ch_ring[slots].tolist())
+        self.ring_head = tail
+        return batch
+
     async def websocket_handler(self, websocket):
         """Handle WebSocket connections and analysis requests from frontend"""
         self.clients.add(websocket)
@@ -164,19 +282,23 @@ class RealOpenBCIServer:
 
             try:
                 # Convert to format expected by processor (channels x samples)
-                channels_data = []
-                for ch in range(8):  # 8 channels
-                    channel_samples = [sample['channels'][ch] for sample in eeg_samples if len(sample.get('channels', [])) > ch]
-                    channels_data.append(np.array(channel_samples))
+                # Stack the samples once, then transpose into one contiguous row per channel
+                samples = np.array(
+                    [sample['channels'][:8] for sample in eeg_samples if len(sample.get('channels', [])) >= 8],
+                    dtype=np.float64
+                ).reshape(-1, 8)
+                channels_data = np.ascontiguousarray(samples.T)
 
                 # Use SCIENTIFIC analysis from backend
                 love_analysis = self.eeg_processor.calculate_love_score(channels_data)
                 frequency_analysis = self.eeg_processor.get_frequency_summary(channels_data)
 
-                print(f"✅ Scientific analysis complete: Love Score = {love_analysis['love_score']}")
-                print(f"   📈 FAA: {love_analysis['raw_values']['faa']:.4f}")
-                print(f"   ⚡ Arousal: {love_analysis['raw_values']['avg_arousal']:.2f}")
-                print(f"   👁️ P300: {love_analysis['raw_values']['p300_amplitude']:.2f}")
+                print(
+                    f"✅ Scientific analysis complete: Love Score = {love_analysis['love_score']}\n"
+                    f"   📈 FAA: {love_analysis['raw_values']['faa']:.4f}\n"
+                    f"   ⚡ Arousal: {love_analysis['raw_values']['avg_arousal']:.2f}\n"
+                    f"   👁️ P300: {love_analysis['raw_values']['p300_amplitude']:.2f}"
+                )
 
                 # Send scientific results back to frontend
                 await websocket.send(json.dumps({
@@ -233,14 +355,18 @@ class RealOpenBCIServer:
     async def broadcast_data(self):
         """Send REAL data to all connected frontends"""
         while True:
-            # Get data from queue
-            if not self.data_queue.empty():
-                data = self.data_queue.get()
+            # Sleep until the serial thread signals new packets instead of polling
+            await self.data_ready.wait()
+            self.data_ready.clear()
+
+            # Drain everything published since the last wake-up
+            for timestamp, packet_num, channels in self.pop_samples():
+                data = EEG_MESSAGE.format(timestamp, packet_num, channels)
 
                 # Send to all clients
                 if self.clients:
                     disconnected = set()
-                    for client in self.clients:
+                    for client in list(self.clients):
                         try:
                             await client.send(data)
                         except:
@@ -249,8 +375,6 @@ class RealOpenBCIServer:
                     # Remove disconnected clients
                     self.clients -= disconnected
 
-            await asyncio.sleep(0.01)  # 100Hz max
-
     async def start(self):
         """Start WebSocket server"""
         # Connect to hardware first
@@ -258,6 +382,10 @@ class RealOpenBCIServer:
             print("Failed to connect to OpenBCI")
             return
 
+        # Serial thread hands packets to the event loop through this event
+        self.loop = asyncio.get_running_loop()
+        self.data_ready = asyncio.Event()
+
         # Start serial reader thread
         serial_thread = threading.Thread(target=self.serial_reader, daemon=True)
         serial_thread.start()